@@ -4,7 +4,6 @@ import logging
 from collections.abc import Generator, Iterator
 from contextlib import contextmanager
 from typing import Any
-from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
@@ -32,19 +31,24 @@ def _normalize_database_url(raw: str) -> str:
     """
     if not raw:
         return raw
-    p = urlparse(raw)
+
+    # Only the scheme and the query change, so plain string slicing is enough;
+    # userinfo, host, port and path pass through untouched.
+    scheme, _, rest = raw.partition("://")
 
     # Only normalise PostgreSQL URLs, leave SQLite and others untouched
-    if p.scheme not in ("postgres", "postgresql"):
+    # (this also returns already-canonical postgresql+psycopg:// URLs as-is)
+    if scheme.lower() not in ("postgres", "postgresql"):
         return raw
 
-    scheme = "postgresql+psycopg"
+    path, _, query = rest.partition("?")
+
+    # Strip sslmode from URL query — we'll pass it via connect_args instead.
+    # Most URLs carry no sslmode at all, so only split the query when needed.
+    if "sslmode" in query:
+        query = "&".join(kv for kv in query.split("&") if kv.partition("=")[0] != "sslmode")
 
-    # Strip sslmode from URL query — we'll pass it via connect_args instead
-    query_pairs = {k: v for k, v in parse_qsl(p.query) if k != "sslmode"}
-    new_query = urlencode(query_pairs)
-    new_p = p._replace(scheme=scheme, query=new_query)
-    return urlunparse(new_p)
+    return f"postgresql+psycopg://{path}?{query}" if query else f"postgresql+psycopg://{path}"
 
 
 _settings = get_settings()
@@ -0,0 +1,54 @@
+"""Plain helpers shared by the test modules (kept out of conftest.py so they can be imported)."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import httpx
+
+# Resolved once; tests that touch project files import these from here.
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+APP_DIR = os.path.join(ROOT_DIR, "app")
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+
+def omdb_search_json(title: str, imdb_id: str, year: str = "2012") -> bytes:
+    """Return a serialized OMDb search payload containing a single result."""
+    return json.dumps(
+        {"Search": [{"Title": title, "imdbID": imdb_id, "Type": "movie", "Year": year}]}
+    ).encode()
+
+
+def omdb_detail_json(
+    title: str, plot: str, rating: str = "7.2", poster: str = "https://img.example.com/p.jpg"
+) -> bytes:
+    """Return a serialized OMDb detail payload."""
+    return json.dumps(
+        {
+            "Title": title,
+            "Plot": plot,
+            "Poster": poster,
+            "Released": "2012-10-31",
+            "imdbRating": rating,
+            "imdbVotes": "2,000",
+            "Genre": "Horror, Thriller",
+        }
+    ).encode()
+
+
+def json_response(body: bytes) -> httpx.Response:
+    """Wrap a pre-serialized JSON body in a fresh 200 response."""
+    return httpx.Response(200, content=body, headers=_JSON_HEADERS)
+
+
+def omdb_router(search: bytes, detail: bytes):
+    """Build a mock handler serving ``detail`` for ?i= lookups, else ``search``."""
+
+    def _route(req: httpx.Request) -> httpx.Response:
+        # apikey always comes first, so a detail lookup carries "&i=" in the raw query
+        return json_response(detail if b"&i=" in req.url.query else search)
+
+    return _route
@@ -9,13 +9,20 @@ import os
 # be sent back, breaking flash messages and session state.
 os.environ.setdefault("DEBUG", "true")
 
+import httpx  # noqa: E402
 import pytest  # noqa: E402
+from argon2 import PasswordHasher  # noqa: E402
 from fastapi.testclient import TestClient  # noqa: E402
 from sqlalchemy import StaticPool, create_engine  # noqa: E402
 from sqlalchemy.orm import sessionmaker  # noqa: E402
 
+from app import security  # noqa: E402
 from app.db import Base, get_db  # noqa: E402
 from app.main import app  # noqa: E402
+from app.services import omdb_client  # noqa: E402
+from app.services.omdb_client import OMDbClient  # noqa: E402
+from app.services.strategies import embedding_omdb, keyword_omdb  # noqa: E402
+from app.settings import AppSettings  # noqa: E402
 
 # In-memory SQLite so tests never touch the real database.
 _test_engine = create_engine(
@@ -46,6 +53,11 @@ def _override_get_db():
 # Swap the real DB dependency for the in-memory one.
 app.dependency_overrides[get_db] = _override_get_db
 
+# Password hashing dominates the auth tests' runtime. Use argon2 with the
+# cheapest parameters it accepts: hashes are still real and verifiable,
+# just not brute-force resistant (irrelevant for throwaway test users).
+security._ph = PasswordHasher(time_cost=1, memory_cost=8, parallelism=1)
+
 
 @pytest.fixture()
 def client():
@@ -54,6 +66,41 @@ def client():
         yield c
 
 
+@pytest.fixture(scope="session")
+def _omdb_app_settings():
+    """Settings with a dummy OMDb key, validated once per session."""
+    return AppSettings(OMDB_API_KEY="dummy")
+
+
+@pytest.fixture()
+def omdb_settings(monkeypatch, _omdb_app_settings):
+    """Point the OMDb client at fixed test settings.
+
+    Leaves the real get_settings() cache alone, so nothing is re-read from
+    the environment between tests.
+    """
+    monkeypatch.setattr(omdb_client, "get_settings", lambda: _omdb_app_settings)
+    return _omdb_app_settings
+
+
+@pytest.fixture()
+def mock_omdb(monkeypatch):
+    """Send OMDb traffic to an in-process handler instead of the network.
+
+    Call the returned function with ``handler(request) -> httpx.Response``;
+    the strategies' OMDb clients then use ``httpx.MockTransport(handler)``.
+    """
+
+    def _install(handler):
+        async def _get_client() -> OMDbClient:
+            return OMDbClient(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        for module in (keyword_omdb, embedding_omdb):
+            monkeypatch.setattr(module, "get_omdb_client", _get_client)
+
+    return _install
+
+
 @pytest.fixture()
 def db():
     """Provide a raw DB session for direct assertions."""
@@ -4,11 +4,70 @@ Simple Stripe Integration Test
 Tests the coffee button and payment flow without starting the full server.
 """
 
+import mmap
 import os
+import re
 import sys
-from pathlib import Path
+from dataclasses import dataclass
 
-from dotenv import load_dotenv
+# Optional modules are imported on first use and cached here, so a run that
+# never reaches the step needing them doesn't pay for the import.
+_dotenv = None
+_stripe = None
+
+
+def _get_load_dotenv():
+    """Return ``dotenv.load_dotenv``, importing it on first call."""
+    global _dotenv
+    if _dotenv is None:
+        from dotenv import load_dotenv as _dotenv
+    return _dotenv
+
+
+def _get_stripe():
+    """Return the ``stripe`` module, or None if it is not installed."""
+    global _stripe
+    if _stripe is None:
+        try:
+            import stripe as _stripe
+        except ImportError:
+            return None
+    return _stripe
+
+
+# Stripe variables are read once into ENV instead of on every lookup;
+# unset keys are stored as None so they are not probed again either.
+_ENV_KEYS = (
+    "STRIPE_PUBLISHABLE_KEY",
+    "STRIPE_SECRET_KEY",
+    "COFFEE_PRICE_ID",
+    "STRIPE_WEBHOOK_SECRET",
+)
+ENV: dict[str, str | None] = {}
+
+
+def clear_env_cache():
+    """Re-read the Stripe variables (call after the environment changes)."""
+    env_get = os.environ.get
+    ENV.clear()
+    ENV.update({key: env_get(key) for key in _ENV_KEYS})
+
+
+clear_env_cache()
+
+
+@dataclass(frozen=True)
+class StripeConfig:
+    """Stripe settings, built once the required variables have been checked."""
+
+    pk: str
+    sk: str
+    price_id: str
+
+
+def mask(value):
+    """Return ``value`` shortened for display, or ``***`` if too short to show safely."""
+    return f"{value[:8]}...{value[-4:]}" if len(value) > 12 else "***"
 
 
 def test_stripe_configuration():
@@ -16,84 +75,114 @@ def test_stripe_configuration():
     print("🧪 Testing Stripe Configuration")
     print("=" * 40)
 
-    # Load environment variables
-    load_dotenv()
-
     # Check environment variables
     required_vars = {
-        "STRIPE_PUBLISHABLE_KEY": os.getenv("STRIPE_PUBLISHABLE_KEY"),
-        "STRIPE_SECRET_KEY": os.getenv("STRIPE_SECRET_KEY"),
-        "COFFEE_PRICE_ID": os.getenv("COFFEE_PRICE_ID"),
+        "STRIPE_PUBLISHABLE_KEY": ENV["STRIPE_PUBLISHABLE_KEY"],
+        "STRIPE_SECRET_KEY": ENV["STRIPE_SECRET_KEY"],
+        "COFFEE_PRICE_ID": ENV["COFFEE_PRICE_ID"],
     }
 
     print("📋 Environment Variables:")
     for var, value in required_vars.items():
         if value:
-            if "SECRET" in var:
-                display_value = f"{value[:8]}...{value[-4:]}" if len(value) > 12 else "***"
-            else:
-                display_value = value
-            print(f"✅ {var}: {display_value}")
+            print(f"✅ {var}: {mask(value) if 'SECRET' in var else value}")
         else:
             print(f"❌ {var}: Not set")
             return False
 
+    # Validated once; everything below trusts the config
+    config = StripeConfig(
+        pk=required_vars["STRIPE_PUBLISHABLE_KEY"],
+        sk=required_vars["STRIPE_SECRET_KEY"],
+        price_id=required_vars["COFFEE_PRICE_ID"],
+    )
+
     # Test Stripe API connection
-    try:
-        import stripe
+    stripe = _get_stripe()
+    if stripe is None:
+        print("❌ Stripe package not installed")
+        return False
 
-        stripe.api_key = required_vars["STRIPE_SECRET_KEY"]
+    try:
+        stripe.api_key = config.sk
+        # One shared client (a pooled requests.Session) so every API call
+        # reuses a single TLS connection to api.stripe.com
+        stripe.default_http_client = stripe.new_default_http_client()
 
         print("\n🔗 Testing Stripe API Connection:")
-        account = stripe.Account.retrieve()
-        print(f"✅ Connected to account: {account.id}")
-        print(f"✅ Account type: {account.type}")
+        # Check the key locally instead of an Account.retrieve round-trip;
+        # a bad key still fails the price lookup below
+        if not config.sk.startswith(("sk_test_", "sk_live_")):
+            print("❌ Secret key format is invalid")
+            return False
+        mode = "test" if config.sk.startswith("sk_test_") else "live"
+        print(f"✅ Using Stripe secret key ({mode} mode)")
 
-        # Test price
-        price = stripe.Price.retrieve(required_vars["COFFEE_PRICE_ID"])
+        # Test price, with its product expanded in the same request
+        price = stripe.Price.retrieve(config.price_id, expand=["product"])
         print(f"✅ Price: ${price.unit_amount/100:.2f} {price.currency.upper()}")
-        print(f"✅ Product: {price.product}")
+        print(f"✅ Product: {price.product.name} ({price.product.id})")
 
         return True
 
-    except ImportError:
-        print("❌ Stripe package not installed")
-        return False
     except Exception as e:
         print(f"❌ Stripe connection failed: {e}")
         return False
 
 
+_TEMPLATES_DIR = "app/templates"
+_STRIPE_TEMPLATES = ("coffee.html", "coffee_success.html", "coffee_cancel.html")
+
+
+def _preflight_paths():
+    """Map each template path the checks need to whether it exists."""
+    # One directory read covers every template instead of a stat() each
+    try:
+        present = {entry.name for entry in os.scandir(_TEMPLATES_DIR)}
+    except FileNotFoundError:
+        present = set()
+    return {
+        f"{_TEMPLATES_DIR}/{name}": name in present for name in ("index.html", *_STRIPE_TEMPLATES)
+    }
+
+
+PATHS = _preflight_paths()
+
+
+# Coffee button markers expected in index.html -> label for the report.
+# Kept as UTF-8 bytes so the template can be scanned without decoding it.
+_COFFEE_BUTTON_MARKERS = {
+    b"Buy me a coffee": "Coffee button text",
+    "☕".encode(): "Coffee emoji",
+    b"/stripe/coffee": "Coffee button link",
+}
+_COFFEE_BUTTON_RE = re.compile(b"|".join(map(re.escape, _COFFEE_BUTTON_MARKERS)))
+
+
 def test_coffee_button_html():
     """Test that the coffee button HTML is correct."""
     print("\n🎨 Testing Coffee Button HTML")
     print("=" * 40)
 
-    index_file = Path("app/templates/index.html")
-    if not index_file.exists():
+    index_file = f"{_TEMPLATES_DIR}/index.html"
+    if not PATHS[index_file]:
         print("❌ index.html not found")
         return False
 
-    content = index_file.read_text()
-
-    # Check for coffee button
-    if "Buy me a coffee" in content:
-        print("✅ Coffee button text found")
-    else:
-        print("❌ Coffee button text not found")
-        return False
-
-    if "☕" in content:
-        print("✅ Coffee emoji found")
-    else:
-        print("❌ Coffee emoji not found")
-        return False
+    # One pass over the memory-mapped template finds every marker at once
+    with open(index_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            found = set()  # mmap refuses empty files
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                found = set(_COFFEE_BUTTON_RE.findall(mm))
 
-    if "/stripe/coffee" in content:
-        print("✅ Coffee button link found")
-    else:
-        print("❌ Coffee button link not found")
-        return False
+    for marker, label in _COFFEE_BUTTON_MARKERS.items():
+        if marker in found:
+            print(f"✅ {label} found")
+        else:
+            print(f"❌ {label} not found")
+            return False
 
     return True
 
@@ -103,14 +192,9 @@ def test_stripe_templates():
     print("\n📄 Testing Stripe Templates")
     print("=" * 40)
 
-    templates = [
-        "app/templates/coffee.html",
-        "app/templates/coffee_success.html",
-        "app/templates/coffee_cancel.html",
-    ]
-
-    for template in templates:
-        if Path(template).exists():
+    for name in _STRIPE_TEMPLATES:
+        template = f"{_TEMPLATES_DIR}/{name}"
+        if PATHS[template]:
             print(f"✅ {template} exists")
         else:
             print(f"❌ {template} missing")
@@ -149,24 +233,30 @@ def test_stripe_module():
 
 def show_testing_instructions():
     """Show instructions for manual testing."""
-    print("\n🚀 Manual Testing Instructions")
-    print("=" * 40)
-
-    print("To test the complete flow:")
-    print("1. Install FastAPI dependencies:")
-    print("   pip install fastapi uvicorn")
-    print()
-    print("2. Start the server:")
-    print("   uvicorn app.main:app --reload")
-    print()
-    print("3. Open browser to: http://localhost:8000")
-    print("4. Scroll to bottom and click '☕ Buy me a coffee'")
-    print("5. Test with Stripe test card: 4242 4242 4242 4242")
-    print()
-    print("⚠️  WARNING: You're using LIVE Stripe keys!")
-    print("   Consider switching to test keys for development:")
-    print("   STRIPE_PUBLISHABLE_KEY=pk_test_...")
-    print("   STRIPE_SECRET_KEY=sk_test_...")
+    # Instructions are for a human; CI=1 skips them (same switch as the local script)
+    if os.environ.get("CI"):
+        return
+
+    lines = [
+        "\n🚀 Manual Testing Instructions",
+        "=" * 40,
+        "To test the complete flow:",
+        "1. Install FastAPI dependencies:",
+        "   pip install fastapi uvicorn",
+        "",
+        "2. Start the server:",
+        "   uvicorn app.main:app --reload",
+        "",
+        "3. Open browser to: http://localhost:8000",
+        "4. Scroll to bottom and click '☕ Buy me a coffee'",
+        "5. Test with Stripe test card: 4242 4242 4242 4242",
+        "",
+        "⚠️  WARNING: You're using LIVE Stripe keys!",
+        "   Consider switching to test keys for development:",
+        "   STRIPE_PUBLISHABLE_KEY=pk_test_...",
+        "   STRIPE_SECRET_KEY=sk_test_...",
+    ]
+    print("\n".join(lines))
 
 
 def main():
@@ -174,6 +264,10 @@ def main():
     print("🧪 TerrorReco Stripe Integration Test")
     print("=" * 50)
 
+    # Load environment variables
+    _get_load_dotenv()()
+    clear_env_cache()
+
     tests = [
         ("Stripe Configuration", test_stripe_configuration),
         ("Coffee Button HTML", test_coffee_button_html),
@@ -2,9 +2,15 @@
 
 from __future__ import annotations
 
+import asyncio
+import re
+
+import pytest
 from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy.orm import Session
 
+from app.main import app
 from app.models import User  # noqa: I001 – grouped with app imports
 
 # ---------------------------------------------------------------------------
@@ -12,16 +18,27 @@ from app.models import User  # noqa: I001 – grouped with app imports
 # ---------------------------------------------------------------------------
 
 
+# Markers searched for in raw response bytes (no str decode needed)
+_AVATAR = b'class="avatar-btn"'
+_FLASH = b'class="flash"'
+_FLASH_ERR = b'class="flash flash-error"'
+
+# <input type="hidden" name="csrf" value="TOKEN">
+_CSRF_RE = re.compile(rb'name="csrf" value="([^"]+)"')
+
+
+def _extract_csrf(content: bytes) -> str:
+    """Pull the CSRF token out of a rendered form page."""
+    match = _CSRF_RE.search(content)
+    assert match is not None
+    return match.group(1).decode()
+
+
 def _get_csrf(client: TestClient, path: str = "/auth/register") -> str:
     """Fetch a page and extract the CSRF token from the hidden form field."""
     resp = client.get(path)
     assert resp.status_code == 200
-    text = resp.text
-    # <input type="hidden" name="csrf" value="TOKEN">
-    marker = 'name="csrf" value="'
-    start = text.index(marker) + len(marker)
-    end = text.index('"', start)
-    return text[start:end]
+    return _extract_csrf(resp.content)
 
 
 def _register(
@@ -58,6 +75,32 @@ def _login(
     )
 
 
+def _logout(client: TestClient):
+    """Log out and return the response."""
+    return client.post("/auth/logout", follow_redirects=True)
+
+
+async def _register_async(
+    client: AsyncClient,
+    email: str = "user@example.com",
+    password: str = "Str0ngPass!",
+):
+    """Async variant of ``_register`` for tests that drive several clients at once."""
+    resp = await client.get("/auth/register")
+    assert resp.status_code == 200
+    csrf = _extract_csrf(resp.content)
+    return await client.post(
+        "/auth/register",
+        data={
+            "email": email,
+            "password": password,
+            "confirm_password": password,
+            "csrf": csrf,
+        },
+        follow_redirects=True,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Registration tests
 # ---------------------------------------------------------------------------
@@ -68,10 +111,11 @@ class TestRegister:
         """Registering with valid data creates the user and signs them in."""
         resp = _register(client)
         assert resp.status_code == 200
+        body = resp.content
         # Flash success shown on homepage
-        assert "Account created" in resp.text
+        assert b"Account created" in body
         # Avatar visible (first letter of email)
-        assert 'class="avatar-btn"' in resp.text
+        assert _AVATAR in body
 
         # User exists in DB
         user = db.query(User).filter(User.email == "user@example.com").first()
@@ -80,30 +124,45 @@ class TestRegister:
     def test_register_short_password(self, client: TestClient):
         """Passwords shorter than 8 characters are rejected."""
         resp = _register(client, password="short", confirm="short")
-        assert "at least 8 characters" in resp.text
+        assert b"at least 8 characters" in resp.content
 
     def test_register_mismatched_passwords(self, client: TestClient):
         """Mismatched password and confirm_password are rejected."""
         resp = _register(client, password="Str0ngPass!", confirm="Different1!")
-        assert "do not match" in resp.text
+        assert b"do not match" in resp.content
 
     def test_register_invalid_email(self, client: TestClient):
         """Badly-formatted email is rejected."""
         resp = _register(client, email="not-an-email")
-        assert "valid email" in resp.text
+        assert b"valid email" in resp.content
 
     def test_register_duplicate_email(self, client: TestClient):
         """Registering the same email twice shows an error."""
         _register(client, email="dup@example.com")
         # Log out first so we can visit /auth/register again
-        client.post("/auth/logout", follow_redirects=True)
+        _logout(client)
         resp = _register(client, email="dup@example.com")
-        assert "already registered" in resp.text
+        assert b"already registered" in resp.content
 
     def test_register_preserves_email_on_error(self, client: TestClient):
         """Email field stays pre-filled when registration fails."""
         resp = _register(client, email="keep@example.com", password="short", confirm="short")
-        assert 'value="keep@example.com"' in resp.text
+        assert b'value="keep@example.com"' in resp.content
+
+    @pytest.mark.asyncio
+    async def test_register_concurrent(self, db: Session):
+        """Independent registrations can run concurrently on one event loop."""
+        emails = [f"user{i}@example.com" for i in range(5)]
+        transport = ASGITransport(app=app)
+
+        async def register(email: str):
+            # One client per user so session cookies stay separate
+            async with AsyncClient(transport=transport, base_url="http://testserver") as c:
+                return await _register_async(c, email)
+
+        responses = await asyncio.gather(*(register(email) for email in emails))
+        assert all(b"Account created" in resp.content for resp in responses)
+        assert db.query(User).filter(User.email.in_(emails)).count() == len(emails)
 
 
 # ---------------------------------------------------------------------------
@@ -115,37 +174,38 @@ class TestLogin:
     def test_login_success(self, client: TestClient):
         """Correct credentials sign the user in and redirect to home."""
         _register(client)
-        client.post("/auth/logout", follow_redirects=True)
+        _logout(client)
 
         resp = _login(client)
         assert resp.status_code == 200
-        assert "Signed in successfully" in resp.text
-        assert 'class="avatar-btn"' in resp.text
+        body = resp.content
+        assert b"Signed in successfully" in body
+        assert _AVATAR in body
 
     def test_login_wrong_password(self, client: TestClient):
         """Wrong password shows a generic error (no info leakage)."""
         _register(client)
-        client.post("/auth/logout", follow_redirects=True)
+        _logout(client)
 
         resp = _login(client, password="WrongPassword1!")
-        assert "Invalid email or password" in resp.text
+        assert b"Invalid email or password" in resp.content
 
     def test_login_nonexistent_email(self, client: TestClient):
         """Non-existent email shows the same generic error."""
         resp = _login(client, email="nobody@example.com")
-        assert "Invalid email or password" in resp.text
+        assert b"Invalid email or password" in resp.content
 
     def test_login_preserves_email_on_error(self, client: TestClient):
         """Email field stays pre-filled after a failed login."""
         resp = _login(client, email="kept@example.com", password="whatever1234")
-        assert 'value="kept@example.com"' in resp.text
+        assert b'value="kept@example.com"' in resp.content
 
     def test_login_redirect_when_already_logged_in(self, client: TestClient):
         """Visiting /auth/login while logged in redirects to /."""
         _register(client)
         resp = client.get("/auth/login", follow_redirects=True)
         # Should end up on homepage, not the login form
-        assert "Welcome back" not in resp.text
+        assert b"Welcome back" not in resp.content
 
 
 # ---------------------------------------------------------------------------
@@ -157,16 +217,17 @@ class TestLogout:
     def test_logout_clears_session(self, client: TestClient):
         """Signing out clears the session and shows a flash."""
         _register(client)
-        resp = client.post("/auth/logout", follow_redirects=True)
+        resp = _logout(client)
         assert resp.status_code == 200
-        assert "signed out" in resp.text.lower()
+        body = resp.content
+        assert b"signed out" in body.lower()
         # Login/signup buttons should reappear (no avatar)
-        assert 'class="avatar-btn"' not in resp.text
+        assert _AVATAR not in body
 
     def test_logged_out_user_cannot_access_history(self, client: TestClient):
         """Visiting /history/ without a session redirects to login."""
-        resp = client.get("/history/", follow_redirects=True)
-        assert "Log in" in resp.text or "Sign in" in resp.text
+        body = client.get("/history/", follow_redirects=True).content
+        assert b"Log in" in body or b"Sign in" in body
 
 
 # ---------------------------------------------------------------------------
@@ -177,14 +238,14 @@ class TestLogout:
 class TestFlashMessages:
     def test_success_flash_has_correct_class(self, client: TestClient):
         """Success flash uses the default (green) style, not flash-error."""
-        resp = _register(client)
-        assert "Account created" in resp.text
+        body = _register(client).content
+        assert b"Account created" in body
         # The actual flash div should NOT have the error class.
         # We check inside the flash container, not the CSS stylesheet.
-        assert 'class="flash flash-error"' not in resp.text
-        assert 'class="flash"' in resp.text
+        assert _FLASH_ERR not in body
+        assert _FLASH in body
 
     def test_error_flash_has_error_class(self, client: TestClient):
         """Error flash uses the flash-error class."""
         resp = _login(client, email="nobody@x.com")
-        assert 'class="flash flash-error"' in resp.text
+        assert _FLASH_ERR in resp.content
@@ -0,0 +1,26 @@
+"""Uvicorn startup check, kept apart from test_deployment.py.
+
+Spawning a fresh interpreter is by far the slowest deployment check; living in
+its own module lets ``--dist=loadfile`` schedule it on a separate worker
+instead of serializing it behind the cheap checks.
+"""
+
+import subprocess
+import sys
+
+from tests._helpers import ROOT_DIR
+
+
+def test_uvicorn_startup():
+    """Test if uvicorn can start the application."""
+    # A fresh interpreter imports the app the way "uvicorn app.main:app" does,
+    # without the paths, settings and overrides conftest has already applied
+    result = subprocess.run(
+        [sys.executable, "-c", "from app.main import app"],
+        capture_output=True,
+        text=True,
+        timeout=10,
+        cwd=ROOT_DIR,
+    )
+
+    assert result.returncode == 0, f"Uvicorn import failed: {result.stderr}"
@@ -1,53 +1,36 @@
 import httpx
 import pytest
-import respx
 
 from app.services.recommender import recommend_movies
-from app.settings import get_settings
+from tests._helpers import json_response, omdb_detail_json, omdb_router, omdb_search_json
+
+_IMDB_ID = "tt1234567"
+_GORY_SEARCH = omdb_search_json("Gory Night", _IMDB_ID, year="2010")
+_GORY_DETAIL = omdb_detail_json(
+    "Gory Night", "Very gory.", rating="7.0", poster="https://m.media-amazon.com/images/M/abc.jpg"
+)
 
 
 @pytest.mark.asyncio
-@respx.mock
-async def test_recommend_movies_omdb(monkeypatch):
-    monkeypatch.setenv("PROVIDER", "omdb")
-    monkeypatch.setenv("OMDB_API_KEY", "dummy")
-
-    from app import settings as settings_module
-
-    settings_module.get_settings.cache_clear()
-    settings = get_settings()
-    base = settings.OMDB_BASE_URL.rstrip("/")
-
-    # The keyword strategy expands the mood into many search queries,
-    # so we use a generic route that matches all OMDb requests.
-    def _handler(request: httpx.Request) -> httpx.Response:
-        params = dict(request.url.params)
-        if "i" in params:
-            # Detail request
-            return httpx.Response(
-                200,
-                json={
-                    "Title": "Gory Night",
-                    "Plot": "Very gory.",
-                    "Poster": "https://m.media-amazon.com/images/M/abc.jpg",
-                    "Released": "2010-10-31",
-                    "imdbRating": "7.0",
-                    "imdbVotes": "1,000",
-                    "Genre": "Horror, Thriller",
-                },
-            )
-        # Search request
-        return httpx.Response(
-            200,
-            json={
-                "Search": [
-                    {"Title": "Gory Night", "imdbID": "tt1234567", "Type": "movie", "Year": "2010"}
-                ]
-            },
+@pytest.mark.parametrize("strategy_matcher", ["strict", "generic"])
+async def test_recommend_movies_omdb(omdb_settings, mock_omdb, strategy_matcher):
+    base = omdb_settings.OMDB_BASE_URL
+
+    if strategy_matcher == "strict":
+        # Detail lookups are fully predictable, so match the exact URL;
+        # everything else is a search.
+        detail_url = httpx.URL(
+            base, params={"apikey": omdb_settings.OMDB_API_KEY, "i": _IMDB_ID, "plot": "short"}
         )
 
-    respx.get(base + "/").mock(side_effect=_handler)
-    respx.get(base).mock(side_effect=_handler)
+        def handler(req: httpx.Request) -> httpx.Response:
+            return json_response(_GORY_DETAIL if req.url == detail_url else _GORY_SEARCH)
+
+        mock_omdb(handler)
+    else:
+        # The keyword strategy expands the mood into many search queries,
+        # so one handler answers all OMDb requests.
+        mock_omdb(omdb_router(_GORY_SEARCH, _GORY_DETAIL))
 
     movies = await recommend_movies("gory", limit=1)
     assert len(movies) >= 1
@@ -1,50 +1,22 @@
-import httpx
 import pytest
-import respx
 
 from app.services.recommender import recommend_movies
+from tests._helpers import omdb_detail_json, omdb_router, omdb_search_json
 
-
-def _omdb_search_response(title: str, imdb_id: str, year: str = "2012"):
-    """Return a mock OMDb search response containing a single result."""
-    return httpx.Response(
-        200,
-        json={"Search": [{"Title": title, "imdbID": imdb_id, "Type": "movie", "Year": year}]},
-    )
-
-
-def _omdb_detail_response(
-    title: str, plot: str, rating: str = "7.2", poster: str = "https://img.example.com/p.jpg"
-):
-    """Return a mock OMDb detail response."""
-    return httpx.Response(
-        200,
-        json={
-            "Title": title,
-            "Plot": plot,
-            "Poster": poster,
-            "Released": "2012-10-31",
-            "imdbRating": rating,
-            "imdbVotes": "2,000",
-            "Genre": "Horror, Thriller",
-        },
-    )
+# Payloads are serialized once; each mocked request only wraps the bytes.
+_TENSE_SEARCH = omdb_search_json("Tense Night", "tt1111111")
+_TENSE_DETAIL = omdb_detail_json("Tense Night", "Very tense.")
+_GHOST_SEARCH = omdb_search_json("Ghost House", "tt2222222", year="2014")
+_GHOST_DETAIL = omdb_detail_json(
+    "Ghost House", "A haunted house with paranormal activities.", poster="N/A"
+)
 
 
 @pytest.mark.asyncio
-@respx.mock
-async def test_keyword_strategy(monkeypatch):
-    monkeypatch.setenv("OMDB_API_KEY", "dummy")
-
+async def test_keyword_strategy(omdb_settings, mock_omdb):
     # The keyword strategy expands mood into many queries.
-    # Use a generic pattern that matches any OMDb search request.
-    respx.get("https://www.omdbapi.com/").mock(
-        side_effect=lambda req: (
-            _omdb_detail_response("Tense Night", "Very tense.")
-            if "i" in dict(req.url.params)
-            else _omdb_search_response("Tense Night", "tt1111111")
-        )
-    )
+    # A single handler answers every OMDb request.
+    mock_omdb(omdb_router(_TENSE_SEARCH, _TENSE_DETAIL))
 
     movies = await recommend_movies("tense", limit=1, strategy="keyword")
     assert len(movies) >= 1
@@ -52,19 +24,8 @@ async def test_keyword_strategy(monkeypatch):
 
 
 @pytest.mark.asyncio
-@respx.mock
-async def test_embedding_strategy(monkeypatch):
-    monkeypatch.setenv("OMDB_API_KEY", "dummy")
-
-    respx.get("https://www.omdbapi.com/").mock(
-        side_effect=lambda req: (
-            _omdb_detail_response(
-                "Ghost House", "A haunted house with paranormal activities.", poster="N/A"
-            )
-            if "i" in dict(req.url.params)
-            else _omdb_search_response("Ghost House", "tt2222222", year="2014")
-        )
-    )
+async def test_embedding_strategy(omdb_settings, mock_omdb):
+    mock_omdb(omdb_router(_GHOST_SEARCH, _GHOST_DETAIL))
 
     movies = await recommend_movies("paranormal", limit=1, strategy="embedding")
     assert len(movies) >= 1